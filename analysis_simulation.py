@@ -3,6 +3,9 @@
 import math
 import random
 
+import numpy as np
+from numba import njit
+
 
 A= 10 #100 # Amortized investment
 R= 10 #0.83 #%
@@ -10,57 +13,158 @@ CI=0 # total current investment
 TOTAL_ITER=5 # total iterations
 FIXED_CAPITAL= 1000 #1000 # current money at hand
 
-def depreciate(stop=1, rate=R, A=100, CI=0, fixed_capital=1000 ):
+# Explicit signatures make numba compile the kernels eagerly at import (and cache=True
+# keeps the result in __pycache__), so the first live tick doesn't pay the JIT cost
+_KERNEL_SIGNATURE = "UniTuple(float64, 2)(int64, float64, float64, float64, float64)"
+_DECIDE_SIGNATURE = "UniTuple(float64, 2)(float64[::1], int64, float64, float64, float64, float64, int8[::1])"
+
+@njit(_KERNEL_SIGNATURE, cache=True, fastmath=True)
+def _depreciate_kernel(stop, rate, A, CI, fixed_capital):
+    ''' Compiled core of depreciate, returns (current investment, fixed capital) '''
+    ratio=(100.0-rate)/100.0
+    # running sum of A*(1 + r + r^2 + ... + r^i), one multiply per iteration instead of two pow()
+    factor=1.0
+    s=0.0
+    ans=0.0
+    for i in range(stop):
+        if(fixed_capital<A):
+            break
+        fixed_capital-=A # invest A every decrease in rate R
+        s+=factor*A
+        factor*=ratio
+        ans=CI+s
+    return (ans, fixed_capital)
+
+
+_CLOSED_FORM_MIN_STOP = 64 # shorter appreciate runs are stepped directly
+
+# no fastmath here: the stepped path must round exactly like the plain Python loop,
+# its result is what gets stored in data.csv
+@njit(_KERNEL_SIGNATURE, cache=True)
+def _appreciate_kernel(stop, rate, A, CI, fixed_capital):
+    ''' Compiled core of appreciate, returns (current investment, fixed capital)
+        Each step is ans=g*ans-A with g=1+rate/100, so after k steps
+        ans_k = p + (CI-p)*g^k with fixed point p=A/(g-1). For long sweeps the number
+        of steps that can recover A (g*ans_k > A) is solved with a log instead of stepping.
+    '''
+    g=1.0+rate/100.0
+    # short runs (the bots always use stop=1), no growth or nothing to recover: step directly
+    if stop<=_CLOSED_FORM_MIN_STOP or g<=1.0 or A<=0.0:
+        ans=CI
+        for i in range(stop):
+            ans=g*ans
+            if(ans>A):
+                ans-=A
+                fixed_capital+=A # recover A every increase in rate R
+            else:
+                break
+        return (ans, fixed_capital)
+
+    p=A/(g-1.0)
+    if CI>=p:
+        n=stop # at or above the fixed point the investment never drops below A
+    else:
+        # step k+1 succeeds while (p-CI)*g^k < p-A/g
+        t=(p-A/g)/(p-CI)
+        n=0
+        if t>1.0:
+            n=min(stop, int(math.ceil(math.log(t)/math.log(g))))
+        # fix up a possible off-by-one from rounding in the log
+        if n>0 and g*(p+(CI-p)*g**(n-1))<=A:
+            n-=1
+        elif n<stop and g*(p+(CI-p)*g**n)>A:
+            n+=1
+
+    ans=p+(CI-p)*g**n
+    if n<stop:
+        ans=g*ans # the step that could not recover A still grows the investment
+    fixed_capital+=n*A # recover A every increase in rate R
+    return (ans, fixed_capital)
+
+
+def depreciate(stop=1, rate=R, A=100, CI=0, fixed_capital=1000, verbose=False):
     ''' Depreciate the current investment CI by rate R% for stop iterations
         Every time the investment depreciates, invest A amount from fixed capital
         If fixed capital is less than A, stop investing
+        Set verbose to print the progress (off by default, the bots call this every tick)
     '''
-    print("***********************Depreciate***********************")
+    if verbose:
+        print("***********************Depreciate***********************")
     if fixed_capital<A:
-        print("Not enough fixed capital to invest")
+        if verbose:
+            print("Not enough fixed capital to invest")
         return (CI, fixed_capital)
-    ans=0
-    for i in range(1,stop+1):
-        if(fixed_capital<A):
-            break
-        else:
-            fixed_capital-=A # invest A every decrease in rate R
-        
-        ans=CI
-        for j in range(1,i+1):
-            ans+=(pow((100-rate),j-1)/pow(100,j-1))*A
-        print(ans)
-    print("Initial CI:", ans , "Initial Fixed Capital:", fixed_capital)
+    ans, fixed_capital = _depreciate_kernel(int(stop), float(rate), float(A), float(CI), float(fixed_capital))
+    if verbose:
+        print("Initial CI:", ans , "Initial Fixed Capital:", fixed_capital)
     return (round(ans,4), round(fixed_capital,4)) # return current investment and remaining fixed capital
     
 
 
 
-def appreciate(stop=1, rate=R, A=100, CI=0, fixed_capital=1000):
+def appreciate(stop=1, rate=R, A=100, CI=0, fixed_capital=1000, verbose=False):
     ''' 
         Appreciate the current investment CI by rate R% for stop iterations
         Every time the investment appreciates, recover A amount to fixed capital
         If CI is less than A, stop recovering
+        Set verbose to print the progress (off by default, the bots call this every tick)
     '''
-    print("***********************APPRECIATE***********************")
-    ans=CI
-    for i in range(1,stop+1):
-        print(ans)
-        # for j in range(1,i+1):
-        ans=((1+rate/100))*ans
-        if(ans>A):
-            ans-=A  
-            fixed_capital+=A # recover A every increase in rate R
-        else:
-            break
-    CI=ans
-    print("Initial CI:", CI , "Initial Fixed Capital:", fixed_capital)
+    if verbose:
+        print("***********************APPRECIATE***********************")
+    ans, fixed_capital = _appreciate_kernel(int(stop), float(rate), float(A), float(CI), float(fixed_capital))
+    if verbose:
+        print("Initial CI:", ans , "Initial Fixed Capital:", fixed_capital)
     return (round(ans,4), round(fixed_capital,4)) # return current investment and remaining fixed capital
         
 
 
 # Simulate btcusdt price from historical data
 #
+HOLD, BUY, SELL, HALT = 0, 1, -1, 2 # signals written by decide
+
+@njit(_DECIDE_SIGNATURE, cache=True, fastmath=True)
+def decide(prices, last_trade_idx, rate_threshold, amortized, current_investment, fixed_capital, signals):
+    ''' Per-tick trading decision of TradingBot, run over prices[last_trade_idx+1:]
+        signals[i] is set to BUY (price fell by at least rate_threshold %), SELL (rose by it)
+        or HOLD. It is set to HALT where the bot would stop for lack of capital, and later ticks
+        are left untouched. Each buy moves amortized from fixed capital into the investment and
+        each sell moves it back. Returns the final (current investment, fixed capital)
+    '''
+    last_price=prices[last_trade_idx]
+    for i in range(last_trade_idx+1, prices.shape[0]):
+        price=prices[i]
+        rate=round((abs(price-last_price)/last_price)*100, 3)
+        if price<last_price and rate>=rate_threshold:
+            if fixed_capital<amortized:
+                signals[i]=HALT
+                break
+            signals[i]=BUY
+            fixed_capital-=amortized
+            current_investment+=amortized
+            last_price=price
+        elif price>last_price and rate>=rate_threshold:
+            if current_investment<amortized:
+                signals[i]=HALT
+                break
+            signals[i]=SELL
+            current_investment-=amortized
+            fixed_capital+=amortized
+            last_price=price
+        else:
+            signals[i]=HOLD
+    return (current_investment, fixed_capital)
+
+
+def backtest(prices, rate=R, A=100, CI=0, fixed_capital=1000):
+    ''' Replay a whole price series (e.g. LivePriceSimulator(..., preload=True).remaining_prices())
+        through decide in a single compiled call, starting with a trade at prices[0]
+        Returns the signal per tick and the final current investment and fixed capital
+    '''
+    prices=np.ascontiguousarray(prices, dtype=np.float64)
+    signals=np.zeros(prices.shape[0], dtype=np.int8)
+    CI, fixed_capital = decide(prices, 0, float(rate), float(A), float(CI), float(fixed_capital), signals)
+    return (signals, round(CI,4), round(fixed_capital,4))
+
 
 
 
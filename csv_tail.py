@@ -0,0 +1,26 @@
+import csv
+import os
+
+
+def read_last_row(filename, chunk_size=4096):
+    ''' Return the last row of a CSV file as a dict keyed by its header, or None if it has no data rows
+        Only the header line and the tail of the file are read, so restarts don't get
+        slower as the append-only state file grows
+    '''
+    with open(filename, mode='rb') as file:
+        header = file.readline()
+        data_start = file.tell()
+        end = file.seek(0, os.SEEK_END)
+        size = chunk_size
+        while True:
+            start = max(data_start, end - size)
+            file.seek(start)
+            lines = [line for line in file.read(end - start).splitlines() if line.strip()]
+            # the first line of a window that starts mid-file may be cut, so only
+            # trust the last line once there is another one before it
+            if start == data_start or len(lines) >= 2:
+                break
+            size *= 2
+    if not header.strip() or not lines:
+        return None
+    return next(csv.DictReader([header.decode(), lines[-1].decode()]))
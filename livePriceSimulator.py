@@ -1,61 +1,139 @@
 import csv
+import mmap
+import os
 import time
+import warnings
+
+import numpy as np
 
 class LivePriceSimulator:
     """
     A class to simulate a live data feed from a CSV file.
     """
-    def __init__(self, file_path, delay_in_seconds=1):
+    def __init__(self, file_path, delay_in_seconds=1, preload=False):
         """
         Initializes the simulator.
         
         Args:
             file_path (str): The path to the CSV file.
             delay_in_seconds (int/float): The delay between data deliveries.
+            preload (bool): Parse the whole price column into a NumPy array up front.
+                Meant for backtest replays with no delay; prices are then returned as floats.
         """
         self.file_path = file_path
         self.delay = delay_in_seconds
-        self.file = None
-        self.reader = None
+        self.preload = preload
+        self._prices = None
+        self._i = 0
+        self._mm = None
+        self._pos = 0
         self.is_finished = False
 
     def open_file(self):
-        """Opens the CSV file and prepares the reader."""
+        """Memory-maps (or preloads) the CSV file and positions the cursor after the header row."""
+        if self.preload:
+            try:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", UserWarning) # loadtxt warns on empty input, reported below
+                    self._prices = np.loadtxt(self.file_path, delimiter=',', skiprows=1, usecols=0,
+                                              dtype=np.float64, ndmin=1)
+            except FileNotFoundError:
+                print(f"Error: The file '{self.file_path}' was not found.")
+                self.is_finished = True
+            except ValueError as e:
+                print(f"Error: The file '{self.file_path}' has a non-numeric price: {e}")
+                self.is_finished = True
+            else:
+                if self._prices.size == 0:
+                    print(f"Error: The file '{self.file_path}' is empty.")
+                    self._prices = None
+                    self.is_finished = True
+            self._i = 0
+            return
         try:
-            self.file = open(self.file_path, 'r', newline='')
-            self.reader = csv.reader(self.file)
-            next(self.reader) # Skip the header row
+            fd = os.open(self.file_path, os.O_RDONLY)
         except FileNotFoundError:
             print(f"Error: The file '{self.file_path}' was not found.")
             self.is_finished = True
-        except StopIteration:
+            return
+        try:
+            self._mm = mmap.mmap(fd, 0, prot=mmap.PROT_READ)
+        except ValueError: # mmap refuses zero-length files
             print(f"Error: The file '{self.file_path}' is empty.")
             self.is_finished = True
+            return
+        finally:
+            os.close(fd) # the mapping stays valid after the descriptor is closed
+        header_end = self._mm.find(b'\n')
+        self._pos = header_end + 1 if header_end >= 0 else len(self._mm) # Skip the header row
 
     def get_next_price(self):
         """
         Returns the next price from the data feed.
         
+        The first column is returned as csv.reader would give it (quotes removed,
+        whitespace kept). Quoted values spanning several lines are not supported.
+
         Returns:
-            str: The next price data as a string, or None if the data is exhausted.
+            str: The next price data as a string (a float when preloaded), or None if the data is exhausted.
         """
         if self.is_finished:
             return None
-        
-        try:
-            # Get the next row from the CSV file
-            row = next(self.reader)
-            price = row[0]
-            
+
+        if self._prices is not None:
+            if self._i >= len(self._prices):
+                print("No more data left. All prices have been delivered.")
+                self.is_finished = True
+                self._prices = None
+                return None
+            price = float(self._prices[self._i])
+            self._i += 1
+            if self.delay:
+                time.sleep(self.delay)
+            return price
+
+        # Scan the mapped bytes for the next line instead of going through csv.reader
+        size = len(self._mm)
+        while self._pos < size:
+            nl = self._mm.find(b'\n', self._pos)
+            if nl < 0:
+                nl = size # last line without a trailing newline
+            line = self._mm[self._pos:nl]
+            self._pos = nl + 1
+            if line.endswith(b'\r'):
+                line = line[:-1]
+            if not line:
+                continue # skip blank lines
+            if b'"' in line:
+                price = next(csv.reader([line.decode()]))[0] # quoted field, let csv unquote it
+            else:
+                price = line.split(b',', 1)[0].decode()
+
             # Pause to simulate the live data feed
-            time.sleep(self.delay)
-            
+            if self.delay:
+                time.sleep(self.delay)
+
             return price
-        except StopIteration:
-            print("No more data left. All prices have been delivered.")
-            self.is_finished = True
-            self.file.close()
-            return None
+
+        print("No more data left. All prices have been delivered.")
+        self._close()
+        return None
+
+    def remaining_prices(self):
+        """
+        Returns the prices not delivered yet as a NumPy array, for replaying them in one go.
+        Only available when the simulator was created with preload=True.
+        """
+        if self._prices is None:
+            return np.empty(0, dtype=np.float64)
+        return self._prices[self._i:]
+
+    def _close(self):
+        """Releases the memory map and marks the feed as finished."""
+        self.is_finished = True
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
 
 # --- Example Usage ---
 if __name__ == "__main__":
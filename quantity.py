@@ -0,0 +1,45 @@
+import logging
+from decimal import Decimal
+
+
+def compute_quantity(info_filters: dict, current_price: float, capital: float) -> tuple[float, float]:
+    ''' Quantity of the base asset that capital buys at current_price, rounded down to the lot size
+        info_filters is the symbol's filters keyed by filterType (see symbol_info.cached_symbol_filters)
+        Returns (quantity, order value), the quantity is 0.0 when the order would be under MIN_NOTIONAL
+    '''
+    # --- Step 1: Get Trading Filters ---
+    # step size is kept as a Decimal straight from the exchange string so it stays exact
+    lot_size = info_filters.get('LOT_SIZE')
+    step_size = Decimal(lot_size['stepSize']) if lot_size else Decimal(0)
+    min_notional_filter = info_filters.get('MIN_NOTIONAL')
+    min_notional = float(min_notional_filter['minNotional']) if min_notional_filter else 0.0
+
+    if step_size == 0:
+        logging.error("Could not retrieve step size.")
+        exit()
+
+    # --- Step 2: Calculate the Quantity ---
+    # Calculate the raw quantity based on your capital and current price
+    raw_quantity = Decimal(str(capital)) / Decimal(str(current_price))
+
+    # --- Step 3: Round Down to the Correct Lot Size ---
+    # This is the most critical part. We use the step_size to round down
+    # to the nearest valid quantity.
+    # Decimal floor division is exact, float division could land on 49.999... instead of 50.
+    quantity_to_buy = float((raw_quantity // step_size) * step_size)
+
+    # --- Final Check ---
+    # Make sure the calculated quantity is greater than the MIN_NOTIONAL
+    order_value = quantity_to_buy * current_price
+    if order_value < min_notional:
+        logging.warning("Calculated order value %s is less than the minimum notional %s.", order_value, min_notional)
+        logging.warning("Cannot place order with this small amount of capital.")
+        quantity_to_buy = 0.0
+    else:
+        logging.info("Current price: %s", current_price)
+        logging.info("Step size: %s", step_size)
+        logging.info("Raw quantity: %s", raw_quantity)
+        logging.info("Final quantity to buy: %s", quantity_to_buy)
+        logging.info("Total order value: %s", order_value)
+
+    return quantity_to_buy, order_value
@@ -0,0 +1,24 @@
+import time
+
+
+# symbol -> (time fetched, filters keyed by filterType)
+_symbol_filters_cache: dict[str, tuple[float, dict]] = {}
+
+
+def cached_symbol_filters(client, symbol, ttl=3600):
+    ''' Return the filters of client.get_symbol_info(symbol) as a {filterType: filter} dict,
+        reusing the last answer for ttl seconds
+        Symbol filters (tick size, step size, min notional) change rarely, so there is
+        no need to pay a REST round-trip for them on every trade cycle, and the dict is
+        built once per refresh instead of scanning the filter list on every lookup
+    '''
+    now = time.time()
+    cached = _symbol_filters_cache.get(symbol)
+    if cached and now - cached[0] < ttl:
+        return cached[1]
+    info = client.get_symbol_info(symbol)
+    if info is None:
+        return {}
+    filters = {f['filterType']: f for f in info['filters']}
+    _symbol_filters_cache[symbol] = (now, filters)
+    return filters
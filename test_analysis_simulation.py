@@ -0,0 +1,75 @@
+import math
+import random
+
+import pytest
+
+pytest.importorskip("numba")
+
+from analysis_simulation import appreciate, depreciate
+
+
+def _appreciate_loop(stop, rate, A, CI, fixed_capital):
+    ''' The original step-by-step appreciate, used as the reference '''
+    ans=CI
+    for i in range(1,stop+1):
+        ans=((1+rate/100))*ans
+        if(ans>A):
+            ans-=A
+            fixed_capital+=A
+        else:
+            break
+    return (round(ans,4), round(fixed_capital,4))
+
+
+def _depreciate_loop(stop, rate, A, CI, fixed_capital):
+    ''' The original pow() based depreciate, used as the reference '''
+    if fixed_capital<A:
+        return (CI, fixed_capital)
+    ans=0
+    for i in range(1,stop+1):
+        if(fixed_capital<A):
+            break
+        fixed_capital-=A
+        ans=CI
+        for j in range(1,i+1):
+            ans+=(pow((100-rate),j-1)/pow(100,j-1))*A
+    return (round(ans,4), round(fixed_capital,4))
+
+
+def test_appreciate_single_step_matches_loop_exactly():
+    # the rounded CI is what the bots store in data.csv
+    assert appreciate(1, 0.005, 10, 577, 70) == _appreciate_loop(1, 0.005, 10, 577, 70)
+    rng = random.Random(0)
+    for _ in range(20000):
+        args = (rng.randint(0, 64), rng.uniform(0.001, 30), rng.uniform(1, 100),
+                rng.uniform(0, 2000), rng.uniform(0, 1000))
+        assert appreciate(*args) == _appreciate_loop(*args), args
+
+
+def test_appreciate_closed_form_matches_loop():
+    rng = random.Random(1)
+    for _ in range(5000):
+        args = (rng.randint(65, 2000), rng.choice([0.0, rng.uniform(0.001, 30)]),
+                rng.choice([0.0, rng.uniform(1, 100)]), rng.uniform(0, 2000), rng.uniform(0, 1000))
+        ans, fixed_capital = appreciate(*args)
+        ref_ans, ref_fixed_capital = _appreciate_loop(*args)
+        assert math.isclose(ans, ref_ans, rel_tol=1e-6, abs_tol=1e-3), args
+        assert math.isclose(fixed_capital, ref_fixed_capital, rel_tol=1e-6, abs_tol=1e-3), args
+
+
+def test_appreciate_at_fixed_point_recovers_every_step():
+    # CI == A/(g-1) stays at the fixed point, so each of the stop steps recovers A
+    ans, fixed_capital = appreciate(100, 10, 10, 100, 0)
+    assert math.isclose(ans, 100, rel_tol=1e-9)
+    assert fixed_capital == 1000
+
+
+def test_depreciate_matches_loop():
+    rng = random.Random(2)
+    for _ in range(2000):
+        args = (rng.randint(0, 50), rng.uniform(0.001, 30), rng.uniform(1, 100),
+                rng.uniform(0, 2000), rng.uniform(0, 1000))
+        ans, fixed_capital = depreciate(*args)
+        ref_ans, ref_fixed_capital = _depreciate_loop(*args)
+        assert math.isclose(ans, ref_ans, rel_tol=1e-9, abs_tol=1e-3), args
+        assert math.isclose(fixed_capital, ref_fixed_capital, rel_tol=1e-9, abs_tol=1e-3), args
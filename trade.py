@@ -1,29 +1,46 @@
 
-import math
 import time
+import logging
+import requests
 from binance.client import Client
+from binance.exceptions import BinanceAPIException, BinanceRequestException
 import csv, os
+import atexit
+from dataclasses import dataclass
 from analysis_simulation import depreciate, appreciate
+from symbol_info import cached_symbol_filters
+from quantity import compute_quantity
+from csv_tail import read_last_row
 import  config as cfg
 
+# API/network failures that are worth retrying, anything else is a bug
+RETRYABLE_ERRORS = (BinanceAPIException, BinanceRequestException, requests.RequestException)
 
 
-client = None
-def connect_to_binance():
-    ''' Connect to the Binance API using the provided API key and secret '''
-    try:
-        client = Client(cfg.API_KEY, cfg.API_SECRET)
-        # Test connectivity
-        client.ping()
-        print("Successfully connected to the Binance API!")
-        return client
-    except Exception as e:
-        print(f"Error connecting to Binance API: {e}")
-        return None
+
+_client = None
+def get_client():
+    ''' Return the process-wide Binance client, connecting on first use
+        Reusing one Client keeps its HTTP session (and TLS connection) alive between calls.
+        Returns None if the connection fails, the next call retries
+    '''
+    global _client
+    if _client is None:
+        try:
+            client = Client(cfg.API_KEY, cfg.API_SECRET)
+            # Test connectivity
+            client.ping()
+            logging.info("Successfully connected to the Binance API!")
+            _client = client
+        except Exception as e:
+            logging.error("Error connecting to Binance API: %s", e)
+    return _client
 
 
-# Function to get current price of a symbol
-get_current_price = lambda symbol: client.get_symbol_ticker(symbol=symbol) if client else None
+def get_current_price(symbol):
+    ''' Get current price of a symbol, None if not connected '''
+    client = get_client()
+    return client.get_symbol_ticker(symbol=symbol) if client else None
 
 
 
@@ -31,99 +48,107 @@ get_current_price = lambda symbol: client.get_symbol_ticker(symbol=symbol) if cl
 def buy(symbol, quantity):
     ''' Place a market buy order for the given symbol and quantity '''
     try:
-        order = client.order_market_buy(
+        order = get_client().order_market_buy(
             symbol=symbol,
             quantity=quantity)
-        print(f"Buy order placed: {order}")
+        logging.info("Buy order placed: %s", order)
         return order
     except Exception as e:
-        print(f"Error placing buy order: {e}")
+        logging.error("Error placing buy order: %s", e)
         return None
     
 def sell(symbol, quantity):
     ''' Place a market sell order for the given symbol and quantity '''
     try:
-        order = client.order_market_sell(
+        order = get_client().order_market_sell(
             symbol=symbol,
             quantity=quantity)
-        print(f"Sell order placed: {order}") 
+        logging.info("Sell order placed: %s", order)
         return order
     except Exception as e:
-        print(f"Error placing sell order: {e}")
+        logging.error("Error placing sell order: %s", e)
         return None
 
+@dataclass(slots=True)
+class BotState:
+    ''' Trading state of TradeBot, parsed once from the csv instead of on every tick '''
+    amortized_investment: float
+    rate: float
+    current_investment: float
+    fixed_capital: float
+    last_trade_price: float
+    symbol: str = cfg.SYMBOL
+    quantity_to_trade: float = 0.0
+    actual_order_value: float = 0.0
+
+    @classmethod
+    def from_row(cls, row):
+        ''' Build the state from a csv row, the last trade's quantity/order value are not needed to resume '''
+        return cls(
+            amortized_investment=float(row['amortized_investment']),
+            rate=float(row['rate']),
+            current_investment=float(row['current_investment']),
+            fixed_capital=float(row['fixed_capital']),
+            last_trade_price=float(row['last_trade_price']),
+            symbol=row.get('symbol') or cfg.SYMBOL)
+
+    def to_row(self):
+        ''' The state as a csv row, using the column names already in data.csv '''
+        return {
+            'amortized_investment': self.amortized_investment,
+            'rate': self.rate,
+            'current_investment': self.current_investment,
+            'fixed_capital': self.fixed_capital,
+            'symbol': self.symbol,
+            'last_trade_price': self.last_trade_price,
+            'quantity_to_trade': self.quantity_to_trade,
+            'Actual_order_value': self.actual_order_value
+        }
+
+_csv_files = {}  # filename -> (open file, csv writer)
+
 def save_params_to_csv(params, filename='data.csv'):  
-    ''' Save parameters to a CSV file '''
-    file_exists = os.path.isfile(filename)
-    with open(filename, mode='a', newline='') as file:
+    ''' Save parameters to a CSV file
+        The file is kept open between calls, each row is flushed right away since it
+        records a trade that was already sent to the exchange
+    '''
+    entry = _csv_files.get(filename)
+    if entry is None:
+        file = open(filename, mode='a', newline='', buffering=8192)
         writer = csv.writer(file)
-        if not file_exists:
-            writer.writerow(params.keys())  # write header if file doesn't exist
-        writer.writerow(params.values()) 
+        if file.tell() == 0:
+            writer.writerow(params.keys())  # write header if file is new or empty
+        entry = _csv_files[filename] = (file, writer)
+    entry[1].writerow(params.values())
+    entry[0].flush()
+
+@atexit.register
+def _close_csv_files():
+    ''' Flush and close the csv files opened by save_params_to_csv '''
+    for file, _ in _csv_files.values():
+        file.close()
+    _csv_files.clear()
 
 def read_params_from_csv(filename='data.csv'):
     ''' Read parameters from a CSV file '''
     if not os.path.isfile(filename):
-        print(f"File {filename} does not exist.")
+        logging.warning("File %s does not exist.", filename)
         return None
-    with open(filename, mode='r') as file:
-        reader = csv.DictReader(file)
-        params = list(reader)
-        if params:
-            return params[-1]  # return the last row as a dictionary
-        else:
-            print(f"No data found in {filename}.")
-            return None
+    params = read_last_row(filename)  # the last row as a dictionary
+    if params is None:
+        logging.warning("No data found in %s.", filename)
+    return params
 
 def get_quantity_to_trade(symbol=cfg.SYMBOL, amortized_investment=cfg.A):
-    # --- Step 1: Get Exchange Information ---
-    # This is crucial for getting the trading rules for the symbol
-    info = client.get_symbol_info(symbol)
-
-    # --- Step 2: Get Trading Filters ---
-    # Find the filters that determine min/max quantities and price
-    step_size = 0.0
-    min_notional = 0.0
-
-    for f in info['filters']:
-        if f['filterType'] == 'LOT_SIZE':
-            step_size = float(f['stepSize'])
-        elif f['filterType'] == 'MIN_NOTIONAL':
-            min_notional = float(f['minNotional'])
-
-    if step_size == 0.0:
-        print("Could not retrieve step size.")
-        exit()
-
-    # --- Step 3: Get Current Price ---
+    ''' Quantity to trade for amortized_investment at the current price, see quantity.compute_quantity '''
+    # Trading rules for the symbol, cached between calls
+    client = get_client()
+    filters = cached_symbol_filters(client, symbol)
+
     ticker = client.get_ticker(symbol=symbol)
     current_price = float(ticker['lastPrice'])
 
-    # --- Step 4: Calculate the Quantity ---
-    # Calculate the raw quantity based on your capital and current price
-    raw_quantity = amortized_investment / current_price
-
-    # --- Step 5: Round Down to the Correct Lot Size ---
-    # This is the most critical part. We use the step_size to round down
-    # to the nearest valid quantity.
-    # We use a math trick to handle floating point precision issues.
-    quantity_to_buy = math.floor(raw_quantity / step_size) * step_size
-
-    # --- Final Check ---
-    # Make sure the calculated quantity is greater than the MIN_NOTIONAL
-    order_value = quantity_to_buy * current_price
-    if order_value < min_notional:
-        print(f"Calculated order value {order_value} is less than the minimum notional {min_notional}.")
-        print("Cannot place order with this small amount of capital.")
-        quantity_to_buy = 0.0
-    else:
-        print(f"Current price: {current_price}")
-        print(f"Step size: {step_size}")
-        print(f"Raw quantity: {raw_quantity}")
-        print(f"Final quantity to buy: {quantity_to_buy}")
-        print(f"Total order value: {order_value}")
-    
-    return quantity_to_buy, order_value
+    return compute_quantity(filters, current_price, amortized_investment)
 
 
 
@@ -142,102 +167,118 @@ def TradeBot():
 
     # Read initial parameters from data.csv
     params = read_params_from_csv('data.csv')
-    current_price=get_current_price(cfg.SYMBOL)
-    if(params is None and current_price is not None):
-        params = {
-            'amortized_investment': cfg.A,  # Amount to invest/recover each time
-            'rate': cfg.R,  # Rate of appreciation/depreciation
-            'current_investment': cfg.CI,  # Current investment
-            'fixed_capital': cfg.FIXED_CAPITAL,  # Fixed capital available
-            'symbol': current_price['symbol'],
-            'last_trade_price': current_price['price'],
-            'quantity_to_trade': 0.0,
-            'Actual_order_value': 0.0
-        }
-        save_params_to_csv(params)
-    # else:
-    #     print("No initial parameters and cannot get current price")
-    #     return # exit if no initial params and cannot get current price
-
-    
+    state = BotState.from_row(params) if params is not None else None
+    retries = 0
+    while(True):
+        try:
+            current_price=get_current_price(cfg.SYMBOL)
+            break
+        except RETRYABLE_ERRORS as e:
+            logging.warning("API: %s", e)
+            time.sleep(min(60, 2**retries))
+            retries += 1
+    if(state is None and current_price is not None):
+        state = BotState(
+            amortized_investment=cfg.A,  # Amount to invest/recover each time
+            rate=cfg.R,  # Rate of appreciation/depreciation
+            current_investment=cfg.CI,  # Current investment
+            fixed_capital=cfg.FIXED_CAPITAL,  # Fixed capital available
+            last_trade_price=float(current_price['price']),
+            symbol=current_price['symbol'])
+        save_params_to_csv(state.to_row())
+    if state is None:
+        logging.error("No initial parameters and cannot get current price")
+        return # exit if no initial params and cannot get current price
+
+    # constant for the whole run, hoisted out of the trading loop
+    symbol = cfg.SYMBOL
+    rate_to_trade = cfg.R
+    amortized_investment = int(state.amortized_investment)
+    retries = 0
 
     while(True):
-        if client is None:
-            #connect to binance
-            client = connect_to_binance()
-            btc_usdt_price=get_current_price(cfg.SYMBOL)
-            print(btc_usdt_price) # Expected output: {'symbol': 'BTCUSDT', 'price': '65000.00000000'}
+        if get_client() is None:
+            # not connected yet, get_client retries on the next call
+            time.sleep(10)
             continue
 
         try:
-            current_price=get_current_price(cfg.SYMBOL)
+            current_price=get_current_price(symbol)
             if(current_price is None):
-                print("Error getting current price")
+                logging.warning("Error getting current price")
                 time.sleep(10)
                 continue
-            print("Current Price:", current_price)
-            last_price=float(params['last_trade_price'])
+            retries = 0
+            logging.info("Current Price: %s", current_price)
+            last_price=state.last_trade_price
             c_p = float(current_price['price'])
-            print(f"Last Trade Price: {last_price}, Current Price: {c_p}")
+            logging.info("Last Trade Price: %s, Current Price: %s", last_price, c_p)
             if(c_p<last_price): # price is depreciating
                 #compute depreciation rate in percentage
                 rate=round(((last_price-c_p))/last_price*100, 3)
-                print(f"Depreciation Rate: {rate}%")
-                print(f"Rate to trade {cfg.R}")
+                logging.info("Depreciation Rate: %s%%", rate)
+                logging.info("Rate to trade %s", rate_to_trade)
 
-                if(rate >= cfg.R): # only trade if rate is greater than configured rate
-                    print(f"Price depreciated from {last_price} to {c_p} by {rate}%")
+                if(rate >= rate_to_trade): # only trade if rate is greater than configured rate
+                    logging.info("Price depreciated from %s to %s by %s%%", last_price, c_p, rate)
                     # Depreciate current investment and invest amortized amount
-                    (new_investment, new_fixed_capital) = depreciate(stop=1, rate=rate, A=int(params['amortized_investment']), CI=float(params['current_investment']), fixed_capital=float(params['fixed_capital']))
-                    if(new_fixed_capital < int(params['amortized_investment'])):
-                        print("Not enough fixed capital to invest. Stopping trading.")
+                    (new_investment, new_fixed_capital) = depreciate(stop=1, rate=rate, A=amortized_investment, CI=state.current_investment, fixed_capital=state.fixed_capital)
+                    if(new_fixed_capital < amortized_investment):
+                        logging.warning("Not enough fixed capital to invest. Stopping trading.")
+                        time.sleep(cfg.SLEEP_TIME) # skipping the trade must not skip the wait between checks
                         continue
 
                     # Place buy order
                     (quantity_to_trade, order_value) = get_quantity_to_trade()
-                    buy(cfg.SYMBOL, quantity_to_trade)  # Round quantity to 6 decimal places
+                    buy(symbol, quantity_to_trade)  # Round quantity to 6 decimal places
 
                     # Update parameters
-                    params['current_investment'] = new_investment
-                    params['fixed_capital'] = new_fixed_capital
-                    params['last_trade_price'] = c_p
-                    params['quantity_to_trade'] = float(quantity_to_trade),
-                    params['Actual_order_value'] = order_value
-                    save_params_to_csv(params)
+                    state.current_investment = new_investment
+                    state.fixed_capital = new_fixed_capital
+                    state.last_trade_price = c_p
+                    state.quantity_to_trade = float(quantity_to_trade)
+                    state.actual_order_value = order_value
+                    save_params_to_csv(state.to_row())
 
-                    print("Quantity to trade:", quantity_to_trade)
+                    logging.info("Quantity to trade: %s", quantity_to_trade)
 
 
             else: # price is appreciating
                 #compute appreciation rate in percentage
                 rate=round(((c_p-last_price))/last_price*100, 3)
-                print(f"Appreciation Rate: {rate}%")
-                print(f"Rate to trade {cfg.R}")
-                if(rate >= cfg.R): # only trade if rate is greater than configured rate
-                    print(f"Price appreciated from {last_price} to {c_p} by {rate}%")
+                logging.info("Appreciation Rate: %s%%", rate)
+                logging.info("Rate to trade %s", rate_to_trade)
+                if(rate >= rate_to_trade): # only trade if rate is greater than configured rate
+                    logging.info("Price appreciated from %s to %s by %s%%", last_price, c_p, rate)
                     # Appreciate current investment and recover amortized amount
-                    (new_investment, new_fixed_capital) = appreciate(stop=1, rate=rate, A=int(params['amortized_investment']), CI=float(params['current_investment']), fixed_capital=float(params['fixed_capital']))
-                    if(new_investment < int(params['amortized_investment'])):
-                        print("Not enough current investment to recover. Stopping trading.")
+                    (new_investment, new_fixed_capital) = appreciate(stop=1, rate=rate, A=amortized_investment, CI=state.current_investment, fixed_capital=state.fixed_capital)
+                    if(new_investment < amortized_investment):
+                        logging.warning("Not enough current investment to recover. Stopping trading.")
+                        time.sleep(cfg.SLEEP_TIME) # skipping the trade must not skip the wait between checks
                         continue
 
                     # Place sell order
                     (quantity_to_trade, order_value) = get_quantity_to_trade()
-                    sell(cfg.SYMBOL, quantity_to_trade)  # Round quantity to 6 decimal places
+                    sell(symbol, quantity_to_trade)  # Round quantity to 6 decimal places
 
                     # Update parameters
-                    params['current_investment'] = new_investment
-                    params['fixed_capital'] = new_fixed_capital
-                    params['last_trade_price'] = c_p
-                    params['quantity_to_trade'] = float(quantity_to_trade),
-                    params['Actual_order_value'] = order_value
+                    state.current_investment = new_investment
+                    state.fixed_capital = new_fixed_capital
+                    state.last_trade_price = c_p
+                    state.quantity_to_trade = float(quantity_to_trade)
+                    state.actual_order_value = order_value
 
-                    print("Quantity to trade:", quantity_to_trade)
+                    logging.info("Quantity to trade: %s", quantity_to_trade)
 
             time.sleep(cfg.SLEEP_TIME) # wait for 1 minute before next check    
-        except:
-            continue    
+        except RETRYABLE_ERRORS as e:
+            # only API/network errors are retried, with exponential backoff; anything else is a bug and propagates
+            logging.warning("API: %s", e)
+            time.sleep(min(60, 2**retries))
+            retries += 1
+            continue
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     TradeBot()  
@@ -2,10 +2,18 @@ import math
 import time
 import csv
 import os
+import atexit
 import logging
+import queue
 from binance.client import Client
+from binance import ThreadedWebsocketManager
 from binance.exceptions import BinanceAPIException, BinanceAPIException, BinanceAPIException
+import numpy as np
 from dotenv import load_dotenv
+from analysis_simulation import decide, BUY, SELL, HALT
+from symbol_info import cached_symbol_filters
+from quantity import compute_quantity
+from csv_tail import read_last_row
 
 # --- Load Environment Variables for Security ---
 load_dotenv()
@@ -14,6 +22,8 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class TradingBot:
+    STATE_FIELDS = ('amortized_investment', 'rate', 'current_investment', 'fixed_capital', 'last_trade_price')  # State CSV columns, in order
+
     def __init__(self, symbol, amortized_investment, rate, fixed_capital, csv_file='data.csv', sleep_time=60, current_investment=0.0):
         """
         Initializes the trading bot with configuration parameters.
@@ -39,9 +49,25 @@ class TradingBot:
         self.current_investment = current_investment
         self.client = self._connect_to_binance()
 
+        # Live prices pushed by the websocket stream, only the newest tick is kept
+        self._price_queue = queue.Queue(maxsize=1)
+        self._twm = None
+
+        # [last trade price, current price] and their signals, reused by decide every tick
+        self._tick_prices = np.zeros(2, dtype=np.float64)
+        self._tick_signals = np.zeros(2, dtype=np.int8)
+
         # Initialize from file or set defaults
         self._load_state()
 
+        # Keep the state file open instead of reopening it on every trade
+        self._state_file = open(self.csv_file, mode='a', newline='', buffering=8192)
+        self._writer = csv.writer(self._state_file)
+        if self._state_file.tell() == 0:
+            self._writer.writerow(self.STATE_FIELDS)
+            self._state_file.flush()
+        atexit.register(self._close_state_file)
+
     def _connect_to_binance(self):
         """Connect to the Binance API and return a client instance."""
         try:
@@ -56,86 +82,69 @@ class TradingBot:
             logging.info("Successfully connected to the Binance API!")
             return client
         except BinanceAPIException as e:
-            logging.error(f"Binance API connection error: {e}")
+            logging.error("Binance API connection error: %s", e)
             return None
         except Exception as e:
-            logging.error(f"General connection error: {e}")
+            logging.error("General connection error: %s", e)
             return None
 
+    def _start_price_stream(self):
+        """Subscribe to the symbol's miniTicker stream so prices are pushed instead of polled."""
+        try:
+            self._twm = ThreadedWebsocketManager(api_key=os.getenv("BINANCE_API_KEY"), api_secret=os.getenv("BINANCE_API_SECRET"))
+            self._twm.start()
+            self._twm.start_symbol_miniticker_socket(callback=self._on_tick, symbol=self.symbol)
+            logging.info("Subscribed to %s miniTicker stream.", self.symbol)
+        except Exception as e:
+            logging.error("Could not start price stream: %s. Falling back to REST polling.", e)
+            self._twm = None
+
+    def _stop_price_stream(self):
+        """Stops the websocket manager thread if it is running."""
+        if self._twm is not None:
+            self._twm.stop()
+            self._twm = None
+
+    def _on_tick(self, msg):
+        """Websocket callback, replaces any unconsumed price with the newest one."""
+        if msg.get('e') == 'error':
+            logging.warning("Price stream error: %s", msg.get('m'))
+            return
+        try:
+            self._price_queue.get_nowait() # drop the stale tick
+        except queue.Empty:
+            pass
+        self._price_queue.put_nowait(float(msg['c']))
+
     def _get_market_data(self):
-        """Get the latest price and symbol information, with robust error handling."""
+        """Get the latest price and the symbol's filters (keyed by filterType), with robust error handling."""
         try:
-            info = self.client.get_symbol_info(self.symbol)
+            filters = cached_symbol_filters(self.client, self.symbol)
+            if self._twm is not None:
+                try:
+                    return filters, self._price_queue.get(timeout=self.sleep_time)
+                except queue.Empty:
+                    logging.warning("No price from stream in %ss. Falling back to REST.", self.sleep_time)
             ticker = self.client.get_ticker(symbol=self.symbol)
-            return info, float(ticker['lastPrice'])
+            return filters, float(ticker['lastPrice'])
         except BinanceAPIException as e:
             if e.code == -1003:
                 logging.warning("Rate limit exceeded. Waiting for 5 minutes.")
                 time.sleep(300)
             else:
-                logging.error(f"API Error getting market data: {e}. Skipping trade cycle.")
+                logging.error("API Error getting market data: %s. Skipping trade cycle.", e)
             return None, None
         except Exception as e:
-            logging.error(f"General error getting market data: {e}. Skipping trade cycle.")
+            logging.error("General error getting market data: %s. Skipping trade cycle.", e)
             return None, None
 
-    def _get_quantity_to_trade(self, info, current_price, investment_amount):
-         # --- Step 1: Get Exchange Information ---
-        # This is crucial for getting the trading rules for the symbol
-        info = self.client.get_symbol_info(self.symbol)
-
-        # --- Step 2: Get Trading Filters ---
-        # Find the filters that determine min/max quantities and price
-        step_size = 0.0
-        min_notional = 0.0
-
-        for f in info['filters']:
-            if f['filterType'] == 'LOT_SIZE':
-                step_size = float(f['stepSize'])
-            elif f['filterType'] == 'MIN_NOTIONAL':
-                min_notional = float(f['minNotional'])
-
-        if step_size == 0.0:
-            print("Could not retrieve step size.")
-            exit()
-
-        # --- Step 3: Get Current Price ---
-        ticker = self.client.get_ticker(symbol=self.symbol)
-        current_price = float(ticker['lastPrice'])
-
-        # --- Step 4: Calculate the Quantity ---
-        # Calculate the raw quantity based on your capital and current price
-        raw_quantity = self.amortized_investment / current_price
-
-        # --- Step 5: Round Down to the Correct Lot Size ---
-        # This is the most critical part. We use the step_size to round down
-        # to the nearest valid quantity.
-        # We use a math trick to handle floating point precision issues.
-        quantity_to_buy = math.floor(raw_quantity / step_size) * step_size
-
-        # --- Final Check ---
-        # Make sure the calculated quantity is greater than the MIN_NOTIONAL
-        order_value = quantity_to_buy * current_price
-        if order_value < min_notional:
-            print(f"Calculated order value {order_value} is less than the minimum notional {min_notional}.")
-            print("Cannot place order with this small amount of capital.")
-            quantity_to_buy = 0.0
-        else:
-            print(f"Current price: {current_price}")
-            print(f"Step size: {step_size}")
-            print(f"Raw quantity: {raw_quantity}")
-            print(f"Final quantity to buy: {quantity_to_buy}")
-            print(f"Total order value: {order_value}")
-
-        return quantity_to_buy, order_value
-
-    def _get_valid_price(self, info, price):
+    def _get_valid_price(self, filters, price):
         """Rounds the price to the nearest tick size for a valid limit order."""
         try:
-            tick_size = float(next(f['tickSize'] for f in info['filters'] if f['filterType'] == 'PRICE_FILTER'))
+            tick_size = float(filters['PRICE_FILTER']['tickSize'])
             return math.floor(price / tick_size) * tick_size
-        except (StopIteration, KeyError) as e:
-            logging.error(f"Could not retrieve PRICE_FILTER: {e}")
+        except KeyError as e:
+            logging.error("Could not retrieve PRICE_FILTER: %s", e)
             return price
 
     def _place_order(self, order_type, quantity, price):
@@ -149,13 +158,13 @@ class TradingBot:
                 logging.error("Invalid order type.")
                 return None
             
-            logging.info(f"{order_type.capitalize()} order placed: {order}")
+            logging.info("%s order placed: %s", order_type.capitalize(), order)
             return order
         except BinanceAPIException as e:
-            logging.error(f"API Error placing order: {e}")
+            logging.error("API Error placing order: %s", e)
             return None
         except Exception as e:
-            logging.error(f"General error placing order: {e}")
+            logging.error("General error placing order: %s", e)
             return None
     
     def _save_state(self):
@@ -164,39 +173,31 @@ class TradingBot:
             logging.warning("No state to save.")
             return
 
-        params = {
-            'amortized_investment': self.amortized_investment,
-            'rate': self.rate,
-            'current_investment': self.current_investment,
-            'fixed_capital': self.fixed_capital,
-            'last_trade_price': self.last_trade_price
-        }
-
-        file_exists = os.path.isfile(self.csv_file)
-        with open(self.csv_file, mode='a', newline='') as file:
-            writer = csv.DictWriter(file, fieldnames=params.keys())
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow(params)
+        # Same order as STATE_FIELDS
+        row = (self.amortized_investment, self.rate, self.current_investment, self.fixed_capital, self.last_trade_price)
+        self._writer.writerow(row)
+        self._state_file.flush() # every row records a placed order, don't leave it in the buffer
         logging.info("Bot state saved.")
 
+    def _close_state_file(self):
+        """Closes the state file."""
+        if not self._state_file.closed:
+            self._state_file.close()
+
     def _load_state(self):
         """Loads bot's state from a CSV file."""
         if not os.path.isfile(self.csv_file):
             logging.info("No state file found. Initializing with default parameters.")
             return
         
-        with open(self.csv_file, mode='r') as file:
-            reader = csv.DictReader(file)
-            params = list(reader)
-            if params:
-                last_state = params[-1]
-                self.last_trade_price = float(last_state['last_trade_price'])
-                self.current_investment = float(last_state['current_investment'])
-                self.fixed_capital = float(last_state['fixed_capital'])
-                logging.info("Bot state loaded from CSV.")
-            else:
-                logging.info("State file is empty. Initializing with default parameters.")
+        last_state = read_last_row(self.csv_file)
+        if last_state:
+            self.last_trade_price = float(last_state['last_trade_price'])
+            self.current_investment = float(last_state['current_investment'])
+            self.fixed_capital = float(last_state['fixed_capital'])
+            logging.info("Bot state loaded from CSV.")
+        else:
+            logging.info("State file is empty. Initializing with default parameters.")
 
     def run_bot(self):
         """Main loop for the trading bot."""
@@ -204,60 +205,63 @@ class TradingBot:
             self.client = self._connect_to_binance() # Retry connection
             logging.error("Failed to connect to Binance API. Retrying in 1 minute.")
             time.sleep(30)
-    
 
+        self._start_price_stream()
+        try:
+            self._trade_loop()
+        finally:
+            self._stop_price_stream()
+
+    def _trade_loop(self):
+        """Reacts to each new price, placing orders when the rate change is large enough."""
         if self.last_trade_price is None:
             # Initial run, get a starting price
-            info, current_price = self._get_market_data()
+            filters, current_price = self._get_market_data()
             if current_price:
                 self.last_trade_price = current_price
-                logging.info(f"Initialized with starting price: {self.last_trade_price}")
+                logging.info("Initialized with starting price: %s", self.last_trade_price)
             else:
                 logging.error("Could not get initial price. Exiting.")
                 return
         
         while True:
-            info, current_price = self._get_market_data()
+            filters, current_price = self._get_market_data()
             if not current_price:
                 time.sleep(self.sleep_time)
                 continue
             
             rate = round((abs(current_price - self.last_trade_price) / self.last_trade_price) * 100, 3)
-            logging.info(f"Current Price: {current_price}, Last Trade Price: {self.last_trade_price}, Rate Change: {rate}%")
-            if current_price < self.last_trade_price and rate >= self.rate:
-                # Price is depreciating
-                logging.info(f"Price depreciated by {rate}%. Considering buy order.")
-                # Simplified logic to fit a single file example
-                # In a real bot, you'd calculate new investment/capital here
-                if self.fixed_capital >= self.amortized_investment:
-                    quantity, order_value = self._get_quantity_to_trade(info, current_price, self.amortized_investment)
-                    if quantity > 0:
-                        limit_price = self._get_valid_price(info, current_price)
-                        order = self._place_order("buy", quantity, limit_price)
-                        if order:
-                            self.last_trade_price = current_price # Update state after successful trade
-                            self._save_state()
-                else:
+            # Debug only: with the websocket feed this runs on every tick (about once a second)
+            logging.debug("Current Price: %s, Last Trade Price: %s, Rate Change: %s%%", current_price, self.last_trade_price, rate)
+            self._tick_prices[0] = self.last_trade_price
+            self._tick_prices[1] = current_price
+            # Simplified logic to fit a single file example: the capitals decide returns
+            # are only used when backtesting, here they are left as loaded
+            decide(self._tick_prices, 0, self.rate, self.amortized_investment,
+                   float(self.current_investment), self.fixed_capital, self._tick_signals)
+            signal = self._tick_signals[1]
+
+            if signal == BUY or signal == SELL:
+                order_type = "buy" if signal == BUY else "sell"
+                direction = "depreciated" if signal == BUY else "appreciated"
+                logging.info("Price %s by %s%%. Considering %s order.", direction, rate, order_type)
+                quantity, order_value = compute_quantity(filters, current_price, self.amortized_investment)
+                if quantity > 0:
+                    limit_price = self._get_valid_price(filters, current_price)
+                    order = self._place_order(order_type, quantity, limit_price)
+                    if order:
+                        self.last_trade_price = current_price # Update state after successful trade
+                        self._save_state()
+
+            elif signal == HALT:
+                if current_price < self.last_trade_price:
                     logging.warning("Not enough fixed capital to invest. Stopping trading.")
-                    break
-            
-            elif current_price > self.last_trade_price and rate >= self.rate:
-                # Price is appreciating
-                logging.info(f"Price appreciated by {rate}%. Considering sell order.")
-                # Simplified logic
-                if self.current_investment >= self.amortized_investment:
-                    quantity, order_value = self._get_quantity_to_trade(info, current_price, self.amortized_investment)
-                    if quantity > 0:
-                        limit_price = self._get_valid_price(info, current_price)
-                        order = self._place_order("sell", quantity, limit_price)
-                        if order:
-                            self.last_trade_price = current_price # Update state after successful trade
-                            self._save_state()
                 else:
                     logging.warning("Not enough current investment to recover. Stopping trading.")
-                    break
+                break
 
-            time.sleep(self.sleep_time)
+            if self._twm is None:
+                time.sleep(self.sleep_time) # polling, the stream paces the loop otherwise
 
 if __name__ == "__main__":
     # Ensure you have a .env file with your API keys